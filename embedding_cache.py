@@ -0,0 +1,97 @@
+"""LRU embedding cache persisted in SQLite; the encoder is passed in by the caller."""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+import numpy as np
+
+EMB_DTYPE = np.float32
+
+
+class EmbeddingCache:
+    """Unit-normalized embeddings for one model, bounded to `max_size` tokens.
+
+    The table mirrors the in-memory entries: rows of other models are dropped
+    when the cache opens, evictions are deleted from it too, and `last_used`
+    is bumped on every hit so recency survives a restart.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        model_key: str,
+        encode: Callable[[List[str], int], np.ndarray],
+        max_size: int = 50_000,
+    ):
+        self.model_key = model_key
+        self.max_size = max_size
+        self._encode = encode
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, token TEXT NOT NULL, vec BLOB NOT NULL, "
+            "last_used INTEGER NOT NULL, PRIMARY KEY (model, token))"
+        )
+        # one model per file: swapping the model/quantization frees the old rows
+        self._db.execute("DELETE FROM embeddings WHERE model != ?", (model_key,))
+        self._db.execute(
+            "DELETE FROM embeddings WHERE token NOT IN "
+            "(SELECT token FROM embeddings ORDER BY last_used DESC, rowid DESC LIMIT ?)",
+            (max_size,),
+        )
+        self._db.commit()
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict(
+            (t, np.frombuffer(v, dtype=EMB_DTYPE))
+            for t, v in self._db.execute(
+                "SELECT token, vec FROM embeddings ORDER BY last_used, rowid"
+            )
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def embed(self, tokens: List[str], batch_size: int = 64) -> np.ndarray:
+        """Return embeddings for `tokens`, encoding only cache misses."""
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for t in tokens:
+                vec = self._entries.get(t)
+                if vec is not None:
+                    self._entries.move_to_end(t)
+                    found[t] = vec
+            if found:
+                now = time.time_ns()
+                self._db.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND token = ?",
+                    [(now, self.model_key, t) for t in found],
+                )
+                self._db.commit()
+
+        misses = [t for t in tokens if t not in found]
+        if misses:
+            new = self._encode(misses, batch_size).astype(EMB_DTYPE)
+            found.update(zip(misses, new))
+            with self._lock:
+                for tok, vec in zip(misses, new):
+                    self._entries[tok] = vec
+                evicted = []
+                while len(self._entries) > self.max_size:
+                    evicted.append(self._entries.popitem(last=False)[0])
+                # insert before deleting: a call with more misses than max_size
+                # evicts some of its own rows, which must not be written back
+                now = time.time_ns()
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, token, vec, last_used) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(self.model_key, t, v.tobytes(), now) for t, v in zip(misses, new)],
+                )
+                self._db.executemany(
+                    "DELETE FROM embeddings WHERE model = ? AND token = ?",
+                    [(self.model_key, t) for t in evicted],
+                )
+                self._db.commit()
+        return np.vstack([found[t] for t in tokens])
@@ -0,0 +1,131 @@
+"""Semantic keyword clustering; the embedding model is passed in by the caller."""
+
+import os
+from collections import Counter
+from typing import Callable, Dict, List, Tuple
+
+import fastcluster
+import numpy as np
+from scipy.cluster.hierarchy import fcluster
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+# ── ML clustering util ────────────────────────────────────────────────────────
+# opt-in (needs the `ann` extra): above ANN_MIN_SIZE keywords the exact
+# complete linkage is replaced by components of an HNSW k-NN graph, i.e.
+# kNN-truncated single linkage. It is not faster than the exact path at a few
+# thousand keywords and clusters differently; it only avoids the O(N²) memory.
+# Both settings are read per call so values from main's load_dotenv() apply.
+
+
+def ann_cluster_labels(
+    emb: np.ndarray, distance_threshold: float, num_threads: int = -1
+) -> np.ndarray:
+    """Connected components of the thresholded HNSW k-NN graph (0-based ids)."""
+    import hnswlib  # optional: `pip install .[ann]`
+
+    n, dim = emb.shape
+    index = hnswlib.Index(space="cosine", dim=dim)
+    index.init_index(max_elements=n, M=16, ef_construction=100)
+    index.set_num_threads(num_threads)
+    index.add_items(emb)
+    index.set_ef(64)
+    k = min(int(os.getenv("ANN_NEIGHBORS", 32)), n)
+    nbrs, dists = index.knn_query(emb, k=k)
+
+    keep = dists <= distance_threshold
+    rows = np.repeat(np.arange(n), nbrs.shape[1])[keep.ravel()]
+    cols = nbrs[keep]
+    adj = csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n, n))
+    _, labels = connected_components(adj, directed=False)
+    return labels
+
+
+def cosine_pdist(emb: np.ndarray, block_rows: int = 256) -> np.ndarray:
+    """Condensed (pdist-order) cosine distances of unit-normalized rows.
+
+    Filled in row blocks of one GEMM each, so peak memory is the float64
+    output plus a `block_rows` × N block rather than the full N×N matrix.
+    """
+    n = len(emb)
+    out = np.empty(n * (n - 1) // 2, dtype=np.float64)
+    pos = 0
+    for i0 in range(0, n, block_rows):
+        blk = emb[i0 : i0 + block_rows] @ emb[i0:].T
+        for r in range(len(blk)):
+            row = blk[r, r + 1 :]  # pairs (i0 + r, j) for j > i0 + r
+            np.subtract(1.0, row, out=out[pos : pos + len(row)])
+            pos += len(row)
+    return out
+
+
+def cluster_labels(
+    emb: np.ndarray, distance_threshold: float, num_threads: int = -1
+) -> np.ndarray:
+    """Cluster ids (0-based) for unit-normalized embeddings.
+
+    Exact complete linkage, unless ANN_MIN_SIZE is set and exceeded.
+    """
+    ann_min_size = int(os.getenv("ANN_MIN_SIZE", 0))  # 0 = always exact
+    if ann_min_size and len(emb) > ann_min_size:
+        return ann_cluster_labels(emb, distance_threshold, num_threads)
+
+    # fastcluster's C complete linkage, cut where merges reach the threshold
+    tree = fastcluster.linkage(cosine_pdist(emb), method="complete")
+    return fcluster(tree, t=distance_threshold, criterion="distance") - 1
+
+
+def top_keywords(
+    keywords: List[str],
+    top_n: int,
+    return_related: bool = False,
+    distance_threshold: float = 0.25,
+    return_cluster_sizes: bool = False,
+    batch_size: int = 64,
+    *,
+    embed: Callable[[List[str], int], np.ndarray],
+    num_threads: int = -1,
+) -> Tuple[List[str], Dict[str, List[str]], Dict[str, int]]:
+    """Cluster keywords semantically and return representatives (+ related).
+
+    `embed(tokens, batch_size)` must return one unit-normalized row per token.
+    """
+    freq: Counter[str] = Counter(k for k in (kw.strip().lower() for kw in keywords) if k)
+    uniques = list(freq)
+    if not uniques:
+        return [], {}, {}
+
+    # a single distinct keyword is its own cluster: no need to embed it
+    if len(uniques) == 1:
+        related_dict = {uniques[0]: []} if return_related else {}
+        cluster_sizes_dict = {uniques[0]: 1} if return_cluster_sizes else {}
+        return uniques, related_dict, cluster_sizes_dict
+
+    emb = embed(uniques, batch_size)
+    labels = cluster_labels(emb, distance_threshold, num_threads)
+
+    # per-cluster totals and most-frequent representative, vectorized
+    freq_arr = np.fromiter((freq[k] for k in uniques), np.int64, count=len(uniques))
+    totals = np.bincount(labels, weights=freq_arr)
+    # stable sort by (label, -freq): each label's first entry is its rep, ties
+    # going to the earliest keyword
+    by_label = np.lexsort((-freq_arr, labels))
+    rep_idx = by_label[np.flatnonzero(np.r_[True, np.diff(labels[by_label]) != 0])]
+    # rank by total; ties keep the clusters' first-seen order
+    _, first_seen = np.unique(labels, return_index=True)
+    ranked = np.lexsort((first_seen, -totals))
+    top_lbls = ranked[:top_n]
+    top_reps = [uniques[rep_idx[lbl]] for lbl in top_lbls]
+
+    # members are only gathered for the clusters that make the cut
+    related_dict: Dict[str, List[str]] = {}
+    cluster_sizes_dict: Dict[str, int] = {}
+    if return_related or return_cluster_sizes:
+        for rep, lbl in zip(top_reps, top_lbls):
+            members = np.flatnonzero(labels == lbl)
+            if return_related:
+                related_dict[rep] = [uniques[i] for i in members if uniques[i] != rep]
+            if return_cluster_sizes:
+                cluster_sizes_dict[rep] = len(members)
+
+    return top_reps, related_dict, cluster_sizes_dict
@@ -1,80 +1,107 @@
+import logging
 import os
-from typing import Dict, List, Tuple
+import threading
+from typing import Dict, List
 
+import numpy as np
+import onnxruntime as ort
+import torch
+from cachetools import TTLCache
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
 
 from pydantic import BaseModel
 from sentence_transformers import SentenceTransformer
-from sklearn.cluster import AgglomerativeClustering
-from sklearn.metrics.pairwise import cosine_similarity
+from threadpoolctl import threadpool_limits
+
+from embedding_cache import EmbeddingCache
+from keywords import top_keywords
 
 # ── Setup ─────────────────────────────────────────────────────────────-------
 load_dotenv()
 
+
+def available_cpus() -> int:
+    """CPUs this process may use: the cgroup v2 quota, else the affinity mask."""
+    cpus = getattr(os, "process_cpu_count", os.cpu_count)() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+# size every compute pool to the container's CPU limit, capped at 8: torch,
+# BLAS/OpenMP (via threadpoolctl, which applies after import) and, below,
+# ONNX Runtime
+NUM_THREADS = int(os.getenv("TORCH_THREADS", min(8, available_cpus())))
+threadpool_limits(limits=NUM_THREADS)
+torch.set_num_threads(NUM_THREADS)
+torch.set_num_interop_threads(1)
+
+logger = logging.getLogger(__name__)
+
 # ── ML model (loaded once) ────────────────────────────────────────────────────
-model = SentenceTransformer("all-MiniLM-L6-v2")
+# default: ONNX Runtime with the hub's dynamic int8 (VNNI) export of MiniLM;
+# MODEL_BACKEND=torch falls back to the FP32 PyTorch model (TORCH_COMPILE=1
+# to torch.compile it)
+MODEL_NAME = "all-MiniLM-L6-v2"
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "onnx")
+ONNX_FILE = os.getenv("ONNX_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+
+if MODEL_BACKEND == "onnx":
+    _ort_opts = ort.SessionOptions()
+    _ort_opts.intra_op_num_threads = NUM_THREADS
+    _ort_opts.inter_op_num_threads = 1
+    model = SentenceTransformer(
+        MODEL_NAME,
+        backend="onnx",
+        model_kwargs={"file_name": ONNX_FILE, "session_options": _ort_opts},
+    )
+    MODEL_KEY = f"{MODEL_NAME}:{ONNX_FILE}"
+else:
+    model = SentenceTransformer(MODEL_NAME)
+    MODEL_KEY = MODEL_NAME
+    # opt-in: inductor on CPU needs a working C++ compiler
+    if os.getenv("TORCH_COMPILE") == "1":
+        _eager = model[0].auto_model
+        model[0].auto_model = torch.compile(_eager, dynamic=True)
+        try:
+            # compilation happens lazily on the first forward pass
+            model.encode(["warm up"], show_progress_bar=False)
+        except Exception as exc:
+            logger.warning("torch.compile failed, using eager mode: %s", exc)
+            model[0].auto_model = _eager
+
+# pay one-off session init / graph compile at startup, not on request 1
+model.encode(["warm up"], show_progress_bar=False)
 
 app = FastAPI()
 PORT = int(os.getenv("PORT", 8000))
 
-
-# ── ML clustering util ────────────────────────────────────────────────────────
-def top_keywords(
-    keywords: List[str],
-    top_n: int,
-    return_related: bool = False,
-    distance_threshold: float = 0.25,
-    return_cluster_sizes: bool = False,
-    batch_size: int = 64,
-) -> Tuple[List[str], Dict[str, List[str]], Dict[str, int]]:
-    """Cluster keywords semantically and return representatives (+ related)."""
-    freq: Dict[str, int] = {}
-    for kw in keywords:
-        k = kw.strip().lower()
-        if k:
-            freq[k] = freq.get(k, 0) + 1
-    uniques = list(freq)
-    if not uniques:
-        return [], {}, {}
-
-    # embeddings + similarity
-    emb = model.encode(uniques, batch_size=batch_size)
-    sim = cosine_similarity(emb)
-
-    clustering = AgglomerativeClustering(
-        distance_threshold=distance_threshold,
-        # HINT: ignore all error or warnings about this
-        n_clusters=None,
-        metric="precomputed",
-        linkage="complete",
-    ).fit(1 - sim)
-
-    # label → list of keywords
-    clusters: Dict[int, List[str]] = {}
-    for kw, lbl in zip(uniques, map(int, clustering.labels_)):
-        clusters.setdefault(lbl, []).append(kw)
-
-    rep_to_related: Dict[str, List[str]] = {}
-    rep_to_cluster_size: Dict[str, int] = {}
-    scores: List[Tuple[str, int]] = []
-
-    for kws in clusters.values():
-        rep = max(kws, key=lambda k: freq[k])  # most-frequent in cluster
-        total = sum(freq[k] for k in kws)
-        scores.append((rep, total))
-        rep_to_related[rep] = [w for w in kws if w != rep]
-        rep_to_cluster_size[rep] = len(kws)
-
-    scores.sort(key=lambda x: x[1], reverse=True)
-    top_reps = [kw for kw, _ in scores[:top_n]]
-
-    related_dict = {k: rep_to_related[k] for k in top_reps} if return_related else {}
-    cluster_sizes_dict = (
-        {k: rep_to_cluster_size[k] for k in top_reps} if return_cluster_sizes else {}
+# ── Embedding cache (persisted across restarts) ───────────────────────────────
+# keyed by model so swapping the model/quantization never serves stale
+# vectors. LRU-bounded to EMB_CACHE_SIZE entries so arbitrary client strings
+# can't grow memory or disk without limit.
+EMB_CACHE_PATH = os.getenv("EMB_CACHE_PATH", "emb_cache.sqlite3")
+EMB_CACHE_SIZE = int(os.getenv("EMB_CACHE_SIZE", 50_000))
+
+
+def _encode(tokens: List[str], batch_size: int) -> np.ndarray:
+    # encode() length-sorts inputs and pads per mini-batch of `batch_size`
+    return model.encode(
+        tokens,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False,
     )
 
-    return top_reps, related_dict, cluster_sizes_dict
+
+emb_cache = EmbeddingCache(EMB_CACHE_PATH, MODEL_KEY, _encode, EMB_CACHE_SIZE)
 
 
 # ── Pydantic models ──────────────────────────────────────────────────────────
@@ -87,9 +114,25 @@ class TopicsRequest(BaseModel):
     batchSize: int = 64
 
 
+# ── Result cache ──────────────────────────────────────────────────────────────
+# the same topic lists are re-posted until the upstream data changes (daily)
+RESULT_CACHE: TTLCache = TTLCache(
+    maxsize=int(os.getenv("RESULT_CACHE_SIZE", 256)),
+    ttl=int(os.getenv("RESULT_CACHE_TTL", 3600)),
+)
+_result_lock = threading.Lock()
+
+# the handler runs in FastAPI's threadpool (up to 40 threads) and every
+# analysis already uses NUM_THREADS cores, so only a few may run at once
+MAX_CONCURRENT_ANALYSES = int(os.getenv("MAX_CONCURRENT_ANALYSES", 1))
+_analysis_slots = threading.BoundedSemaphore(MAX_CONCURRENT_ANALYSES)
+
+
 # ── routes ────────────────────────────────────────────────────────────────────
+# plain `def`: FastAPI runs it in the threadpool so the blocking encode and
+# clustering don't stall the event loop
 @app.post("/analyze-keywords")
-async def analyze_keywords_post(request: TopicsRequest):
+def analyze_keywords_post(request: TopicsRequest):
     """
     POST /analyze-keywords
     Accepts a list of topics and returns the analysis result.
@@ -108,19 +151,37 @@ async def analyze_keywords_post(request: TopicsRequest):
     if not (1 <= request.batchSize <= 512):
         raise HTTPException(status_code=400, detail="batchSize must be between 1 and 512")
 
-    top, related, cluster_sizes = top_keywords(
-        request.topics,
+    # batchSize only affects speed, so it is not part of the key
+    key = (
+        tuple(request.topics),
         request.topN,
         request.includeRelated,
         request.distance_threshold,
         request.includeClusterSizes,
-        batch_size=request.batchSize,
     )
+    with _result_lock:
+        cached = RESULT_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    with _analysis_slots:
+        top, related, cluster_sizes = top_keywords(
+            request.topics,
+            request.topN,
+            request.includeRelated,
+            request.distance_threshold,
+            request.includeClusterSizes,
+            batch_size=request.batchSize,
+            embed=emb_cache.embed,
+            num_threads=NUM_THREADS,
+        )
     resp: Dict[str, object] = {"topKeywords": top}
     if request.includeRelated:
         resp["related"] = related
     if request.includeClusterSizes:
         resp["clusterSizes"] = cluster_sizes
+    with _result_lock:
+        RESULT_CACHE[key] = resp
     return resp
 
 
@@ -0,0 +1,91 @@
+import sqlite3
+from typing import List
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+
+class FakeEncoder:
+    """Deterministic unit vectors per token; records what it was asked to encode."""
+
+    def __init__(self):
+        self.calls: List[List[str]] = []
+
+    def __call__(self, tokens: List[str], batch_size: int) -> np.ndarray:
+        self.calls.append(list(tokens))
+        rows = np.stack(
+            [np.random.default_rng(sum(map(ord, t))).normal(size=8) for t in tokens]
+        )
+        return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def stored(path, model="m"):
+    with sqlite3.connect(path) as db:
+        rows = db.execute("SELECT token FROM embeddings WHERE model = ?", (model,))
+        return {t for (t,) in rows}
+
+
+def test_encodes_only_misses_and_returns_input_order(tmp_path):
+    enc = FakeEncoder()
+    cache = EmbeddingCache(str(tmp_path / "c.sqlite3"), "m", enc, max_size=10)
+    first = cache.embed(["a", "b"])
+    got = cache.embed(["b", "c", "a"])
+    assert enc.calls == [["a", "b"], ["c"]]
+    assert got.dtype == np.float32
+    np.testing.assert_array_equal(got[[0, 2]], first[[1, 0]])
+
+
+def test_evicts_least_recently_used(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    enc = FakeEncoder()
+    cache = EmbeddingCache(path, "m", enc, max_size=2)
+    cache.embed(["a", "b"])
+    cache.embed(["a"])  # b is now the oldest
+    cache.embed(["c"])
+    assert len(cache) == 2
+    assert stored(path) == {"a", "c"}
+    cache.embed(["a", "c"])
+    assert enc.calls == [["a", "b"], ["c"]]
+
+
+def test_more_misses_than_capacity(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    cache = EmbeddingCache(path, "m", FakeEncoder(), max_size=2)
+    tokens = ["a", "b", "c", "d", "e"]
+    got = cache.embed(tokens)
+    assert got.shape == (5, 8)
+    # rows evicted within the same call are deleted after being written
+    assert stored(path) == {"d", "e"}
+
+
+def test_reload_keeps_entries_and_recency(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    cache = EmbeddingCache(path, "m", FakeEncoder(), max_size=3)
+    before = cache.embed(["a", "b", "c"])
+    cache.embed(["a"])  # a was written first but is now the newest
+
+    enc = FakeEncoder()
+    cache = EmbeddingCache(path, "m", enc, max_size=3)
+    cache.embed(["d"])  # evicts b, the least recently used
+    np.testing.assert_array_equal(cache.embed(["a", "c"]), before[[0, 2]])
+    assert enc.calls == [["d"]]
+    assert stored(path) == {"a", "c", "d"}
+
+
+def test_startup_trims_to_max_size_by_recency(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    cache = EmbeddingCache(path, "m", FakeEncoder(), max_size=3)
+    cache.embed(["a", "b", "c"])
+    cache.embed(["a"])
+    cache = EmbeddingCache(path, "m", FakeEncoder(), max_size=1)
+    assert len(cache) == 1
+    assert stored(path) == {"a"}
+
+
+def test_drops_rows_of_other_models(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    EmbeddingCache(path, "old", FakeEncoder()).embed(["a", "b"])
+    cache = EmbeddingCache(path, "new", FakeEncoder())
+    assert len(cache) == 0
+    assert stored(path, "old") == set()
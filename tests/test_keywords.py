@@ -0,0 +1,128 @@
+import tracemalloc
+from typing import List
+
+import numpy as np
+import pytest
+from scipy.spatial.distance import pdist
+
+from keywords import cosine_pdist, top_keywords
+
+# keyword → semantic group; members of a group get near-identical vectors
+GROUPS = {
+    "llm": 0,
+    "llms": 0,
+    "rag": 1,
+    "cursor-ai": 2,
+    "cursor": 2,
+    "ai": 3,
+    "genai": 3,
+    "openai": 3,
+    "tmux": 4,
+}
+
+TOPICS = [
+    "llm", "rag", "cursor-ai", "ai", "genai", "cursor", "openai", "tmux",
+    "LLMs ", "llms", "llms", "llm", " rag", "rag", "RAG", "cursor-ai",
+    "cursor", "genai", "genai",
+]  # fmt: skip
+
+
+def fake_embed(tokens: List[str], batch_size: int) -> np.ndarray:
+    rows = np.zeros((len(tokens), 8), dtype=np.float32)
+    for i, tok in enumerate(tokens):
+        rows[i, GROUPS[tok]] = 1.0
+        rows[i, 5 + i % 3] = 0.1
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def no_embed(tokens: List[str], batch_size: int) -> np.ndarray:
+    raise AssertionError("embed must not be called")
+
+
+def test_empty_input():
+    assert top_keywords(["", "  "], 5, embed=no_embed) == ([], {}, {})
+
+
+def test_single_keyword_skips_embedding():
+    top, related, sizes = top_keywords(
+        ["React", " react"], 5, True, 0.25, True, embed=no_embed
+    )
+    assert (top, related, sizes) == (["react"], {"react": []}, {"react": 1})
+
+
+def test_fewer_keywords_than_top_n_still_cluster():
+    top, related, sizes = top_keywords(
+        ["llm", "llms", "llms", "rag"], 5, True, 0.25, True, embed=fake_embed
+    )
+    assert top == ["llms", "rag"]
+    assert related == {"llms": ["llm"], "rag": []}
+    assert sizes == {"llms": 2, "rag": 1}
+
+
+def test_reps_ranking_and_related_order():
+    top, related, sizes = top_keywords(TOPICS, 5, True, 0.25, True, embed=fake_embed)
+
+    # llms (3) beats llm (2); cursor-ai/cursor tie goes to the first seen;
+    # equal totals (5, 5 and 4, 4) keep the clusters' first-seen order
+    assert top == ["llms", "genai", "rag", "cursor-ai", "tmux"]
+    # related keywords stay in first-seen order
+    assert related == {
+        "llms": ["llm"],
+        "genai": ["ai", "openai"],
+        "rag": [],
+        "cursor-ai": ["cursor"],
+        "tmux": [],
+    }
+    assert sizes == {"llms": 2, "genai": 3, "rag": 1, "cursor-ai": 2, "tmux": 1}
+
+
+def test_top_n_and_flags_limit_output():
+    top, related, sizes = top_keywords(TOPICS, 2, True, embed=fake_embed)
+    assert top == ["llms", "genai"]
+    assert related == {"llms": ["llm"], "genai": ["ai", "openai"]}
+    assert sizes == {}
+
+    assert top_keywords(TOPICS, 2, embed=fake_embed) == (["llms", "genai"], {}, {})
+
+
+def test_embeds_each_unique_keyword_once():
+    calls = []
+
+    def recording_embed(tokens: List[str], batch_size: int) -> np.ndarray:
+        calls.append((tokens, batch_size))
+        return fake_embed(tokens, batch_size)
+
+    top_keywords(TOPICS, 5, batch_size=16, embed=recording_embed)
+    uniques = list(dict.fromkeys(t.strip().lower() for t in TOPICS))
+    assert calls == [(uniques, 16)]
+
+
+def test_ann_path_matches_exact_on_separated_groups(monkeypatch):
+    pytest.importorskip("hnswlib")
+    exact = top_keywords(TOPICS, 5, True, 0.25, True, embed=fake_embed)
+    monkeypatch.setenv("ANN_MIN_SIZE", "1")
+    assert top_keywords(TOPICS, 5, True, 0.25, True, embed=fake_embed) == exact
+
+
+def unit_rows(n: int, dim: int = 32) -> np.ndarray:
+    rows = np.random.default_rng(0).normal(size=(n, dim)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 7, 300])
+def test_cosine_pdist_matches_scipy(n):
+    emb = unit_rows(n)
+    got = cosine_pdist(emb, block_rows=64)
+    assert got.dtype == np.float64
+    np.testing.assert_allclose(got, pdist(emb.astype(np.float64), "cosine"), atol=1e-6)
+
+
+def test_cosine_pdist_never_builds_the_square_matrix():
+    n = 2000
+    emb = unit_rows(n)
+    tracemalloc.start()
+    cosine_pdist(emb, block_rows=64)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # output (n·(n-1)/2 · 8 B ≈ 16 MB) plus one block; N×N float32 alone is 16 MB
+    assert peak < 1.2 * n * (n - 1) // 2 * 8